@@ -6,7 +6,6 @@ Author: Dinadeyohvsgi + ChatGPT
 """
 
 import os, sys, platform, json, asyncio, time, shutil
-from datetime import datetime
 from collections import deque
 
 # -----------------------------
@@ -15,6 +14,15 @@ from collections import deque
 LOG_DIR = r"C:\ProgramData\TimeSync" if platform.system() == "Windows" else "/var/log/time-sync"
 MEMO_FILE = os.path.join(LOG_DIR, "memo.json")
 STATUS_FILE = os.path.join(LOG_DIR, "status.log")
+os.makedirs(LOG_DIR, exist_ok=True)
+
+def open_in_log_dir(path, mode):
+    # LOG_DIR is created once above; only recreate it if it vanished at runtime
+    try:
+        return open(path, mode, encoding="utf-8")
+    except FileNotFoundError:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        return open(path, mode, encoding="utf-8")
 
 MODE = "fast"
 if "--mode=ultrafast" in sys.argv: MODE = "ultrafast"
@@ -32,11 +40,10 @@ skew_history = deque(maxlen=HISTORY_LEN)
 # Logging helper
 # -----------------------------
 def log(msg):
-    ts = datetime.utcnow().strftime("[%Y-%m-%d %H:%M:%S UTC]")
+    ts = time.strftime("[%Y-%m-%d %H:%M:%S UTC]", time.gmtime())
     line = f"{ts} {msg}"
     print(line)
-    os.makedirs(LOG_DIR, exist_ok=True)
-    with open(STATUS_FILE, "a", encoding="utf-8") as f:
+    with open_in_log_dir(STATUS_FILE, "a") as f:
         f.write(line + "\n")
 
 # -----------------------------
@@ -50,8 +57,7 @@ def load_memo():
     return {}
 
 def save_memo(data):
-    os.makedirs(LOG_DIR, exist_ok=True)
-    with open(MEMO_FILE, "w") as f:
+    with open_in_log_dir(MEMO_FILE, "w") as f:
         json.dump(data, f)
 
 memo = load_memo()
@@ -111,7 +117,12 @@ async def drift_correction_windows():
 # -----------------------------
 def render_graph():
     cols = shutil.get_terminal_size((80, 20)).columns
-    max_val = max([abs(x) for x in skew_history] + [1])
+    # single pass, no temporary list
+    max_val = 1
+    for x in skew_history:
+        ax = x if x >= 0 else -x
+        if ax > max_val:
+            max_val = ax
     scale = max_val / (cols//2)  # center graph
 
     lines = []
@@ -129,8 +140,25 @@ def render_graph():
         lines.append("".join(line))
     return "\n".join(lines)
 
+CLEAR_SCREEN = "\x1b[H\x1b[2J"  # cursor home + erase display
+
+def enable_vt_mode():
+    # Windows consoles need VT processing switched on for ANSI escapes
+    if platform.system() != "Windows":
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        pass
+
 def draw_tui():
-    os.system("cls" if platform.system()=="Windows" else "clear")
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
     print("╔════════════════════════════════════════════╗")
     print("║   Time Drift Monitor (Nanosecond TUI)      ║")
     print("╚════════════════════════════════════════════╝\n")
@@ -142,6 +170,7 @@ def draw_tui():
 # Ultrafast loop
 # -----------------------------
 async def ultrafast_loop():
+    enable_vt_mode()
     while True:
         if platform.system() == "Windows":
             await drift_correction_windows()
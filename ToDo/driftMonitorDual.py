@@ -12,13 +12,17 @@ Author: user + ChatGPT
 
 from __future__ import annotations
 import asyncio
+import atexit
 import os
 import sys
 import platform
 import json
+import re
 import shutil
-from datetime import datetime
-from collections import deque
+import signal
+import struct
+import time
+from array import array
 import argparse
 from typing import Optional
 
@@ -41,6 +45,20 @@ LOG_DIR = (r"C:\ProgramData\TimeSync" if IS_WINDOWS else "/var/log/time-sync")
 os.makedirs(LOG_DIR, exist_ok=True)
 STATUS_FILE = os.path.join(LOG_DIR, "status.log")
 MEMO_FILE = os.path.join(LOG_DIR, "memo.json")
+# Unix measurement/correction tools; PATH does not change during a run
+_CHRONY = shutil.which("chronyc")
+_NTPQ = shutil.which("ntpq")
+# One handle for the whole run; flushed periodically by the loop and on exit
+STATUS_FH = open(STATUS_FILE, "a", encoding="utf-8", buffering=1 << 16)
+atexit.register(STATUS_FH.close)
+STATUS_FLUSH_INTERVAL_NS = 10_000_000_000   # max age of unflushed log lines
+
+def _on_sigterm(signum, frame) -> None:
+    # A service stop sends SIGTERM, which skips atexit: flush before leaving
+    STATUS_FH.flush()
+    os._exit(0)
+
+signal.signal(signal.SIGTERM, _on_sigterm)
 
 # ---------------------------
 # Mode settings
@@ -55,25 +73,78 @@ else:  # fast
     CHECK_INTERVAL = 60             # 1 minute
     PRECISION_THRESHOLD_NS = 100_000  # 0.1 ms
 
+# Adaptive polling: while skew stays under the threshold the ultrafast
+# interval grows by BACKOFF_FACTOR up to MAX_CHECK_INTERVAL; any real drift
+# snaps it back to CHECK_INTERVAL
+BACKOFF_FACTOR = 1.5
+MAX_CHECK_INTERVAL = 60
+
 # ---------------------------
 # Graph / history
 # ---------------------------
 HISTORY_LEN = 80                    # number of samples to show horizontally
-skew_history: deque[int] = deque(maxlen=HISTORY_LEN)
+MAX_GRAPH_LINES = 40                # rows kept on screen (header included)
+
+class SkewRing:
+    """
+    Fixed-size ring buffer of int64 skew samples.
+    Supports append(), len(), indexing (e.g. [-1]) and oldest→newest iteration.
+    `revision` changes whenever the visible contents change.
+    """
+    __slots__ = ("maxlen", "revision", "_buf", "_idx", "_len", "_run")
+
+    def __init__(self, maxlen: int) -> None:
+        self.maxlen = maxlen
+        self.revision = 0
+        self._buf = array("q", bytes(8 * maxlen))
+        self._idx = 0                   # next slot to write
+        self._len = 0
+        self._run = 0                   # trailing run of identical samples
+
+    def append(self, val: int) -> None:
+        self._run = self._run + 1 if self._len and val == self[-1] else 1
+        self._buf[self._idx] = val
+        self._idx = (self._idx + 1) % self.maxlen
+        if self._len < self.maxlen:
+            self._len += 1
+        # A full buffer of identical samples is unchanged by one more of them
+        if self._run <= self.maxlen:
+            self.revision += 1
+
+    def samples(self) -> array:
+        """Return the samples oldest→newest as a contiguous array."""
+        if self._len < self.maxlen:
+            return self._buf[:self._len]
+        return self._buf[self._idx:] + self._buf[:self._idx]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int) -> int:
+        if not -self._len <= i < self._len:
+            raise IndexError("skew history index out of range")
+        if i < 0:
+            i += self._len
+        return self._buf[(self._idx - self._len + i) % self.maxlen]
+
+    def __iter__(self):
+        return iter(self.samples())
+
+skew_history = SkewRing(HISTORY_LEN)
 
 # ---------------------------
 # Helpers
 # ---------------------------
 
 def now_ts() -> str:
-    """Return current UTC timestamp."""
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + " UTC"
+    """Return current UTC timestamp (millisecond resolution)."""
+    secs, frac = divmod(time.time_ns(), 1_000_000_000)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(secs)) + f".{frac // 1_000_000:03d} UTC"
 
 def write_status_log(line: str) -> None:
-    """Append a line to status log (ensures directory exists)."""
-    os.makedirs(LOG_DIR, exist_ok=True)
-    with open(STATUS_FILE, "a", encoding="utf-8") as f:
-        f.write(line + "\n")
+    """Append a line to the buffered status log handle."""
+    STATUS_FH.write(line)
+    STATUS_FH.write("\n")
 
 def log(msg: str) -> None:
     """Console + status log."""
@@ -82,16 +153,17 @@ def log(msg: str) -> None:
     write_status_log(line)
 
 # ---------------------------
-# Async shell runner
+# Async command runner
 # ---------------------------
-async def run_cmd(cmd: str, timeout: Optional[int] = 15) -> str:
+async def run_cmd(argv: list[str], timeout: Optional[int] = 15) -> str:
     """
-    Run a shell command and return stdout as text.
+    Run a command (argv list, no shell) and return stdout as text.
     Captures stderr and logs it (not returned).
     """
+    cmd = " ".join(argv)
     try:
-        proc = await asyncio.create_subprocess_shell(
-            cmd,
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -121,28 +193,174 @@ def load_memo() -> dict:
         log(f"[WARN] Could not load memo: {e}")
     return {}
 
-def save_memo(d: dict) -> None:
-    """Write memo.json atomically."""
+def save_memo(skew_ns: int) -> None:
+    """Write memo.json atomically (preformatted; the memo holds a single int)."""
     try:
         tmp = MEMO_FILE + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(d, f)
+        with open(tmp, "wb") as f:
+            f.write(b'{"last_skew_ns":%d}' % skew_ns)
         os.replace(tmp, MEMO_FILE)
     except Exception as e:
         log(f"[WARN] Could not save memo: {e}")
 
 memo = load_memo()
+# Authoritative last-skew value for the run; memo.json is just its persisted copy
+_last_skew_ns: int = memo.get("last_skew_ns", 0)
+
+# Only rewrite memo.json when the skew moved by more than the precision
+# threshold, or at least once per MEMO_PERSIST_INTERVAL_NS as a heartbeat
+MEMO_PERSIST_INTERVAL_NS = 60_000_000_000
+_last_persist_ns = time.monotonic_ns()
+_last_persisted_skew: int = _last_skew_ns
+
+def persist_memo(skew_ns: int) -> None:
+    """Save memo if skew_ns differs meaningfully from the last persisted value."""
+    global _last_persist_ns, _last_persisted_skew
+    now = time.monotonic_ns()
+    if (abs(skew_ns - _last_persisted_skew) <= PRECISION_THRESHOLD_NS
+            and now - _last_persist_ns <= MEMO_PERSIST_INTERVAL_NS):
+        return
+    save_memo(skew_ns)
+    _last_persist_ns = now
+    _last_persisted_skew = skew_ns
 
 # ---------------------------
-# Skew measurement functions
+# SNTP measurement (primary)
 # ---------------------------
+NTP_SERVER = FORCED_POOL or ("time.windows.com" if IS_WINDOWS else "pool.ntp.org")
+NTP_PORT = 123
+SNTP_TIMEOUT = 2.0                  # seconds to wait for a server reply
+# RFC 4330: a client must not poll a server more often than every 15 s; a
+# kiss-o'-death reply pushes the next query out much further
+SNTP_MIN_INTERVAL_NS = 15_000_000_000
+SNTP_KOD_BACKOFF_NS = 300_000_000_000
+NTP_EPOCH_OFFSET_NS = 2_208_988_800 * 1_000_000_000  # 1900-01-01 -> 1970-01-01
+# LI=0, VN=3, Mode=3 (client); every field up to the transmit timestamp zero
+SNTP_REQUEST_HEAD = struct.pack("!B B B b 9I", 0x1B, 0, 0, 0, *([0] * 9))
+_sntp_next_ns = 0                   # monotonic time before which no query is sent
+_sntp_kod_until_ns = 0              # monotonic end of a kiss-o'-death backoff
+
+class _SntpProtocol(asyncio.DatagramProtocol):
+    """Connected UDP endpoint that hands each reply (+ receive time) to a waiter."""
+
+    def __init__(self) -> None:
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.waiter: Optional[asyncio.Future] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        t4 = time.time_ns()
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result((data, t4))
+
+    def error_received(self, exc: Exception) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(exc)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(exc or ConnectionError("SNTP socket closed"))
+
+_sntp: Optional[_SntpProtocol] = None
+
+def _ntp_to_ns(secs: int, frac: int) -> int:
+    """Convert an NTP (era 0) timestamp to Unix-epoch nanoseconds."""
+    return secs * 1_000_000_000 - NTP_EPOCH_OFFSET_NS + ((frac * 1_000_000_000) >> 32)
+
+def _ns_to_ntp(ns: int) -> bytes:
+    """Pack Unix-epoch nanoseconds as an 8-byte NTP (era 0) timestamp."""
+    secs, rem = divmod(ns + NTP_EPOCH_OFFSET_NS, 1_000_000_000)
+    return struct.pack("!II", secs & 0xFFFFFFFF, (rem << 32) // 1_000_000_000)
+
+def sntp_wait_s() -> float:
+    """Seconds until the RFC 4330 rate limit allows the next SNTP query (0 if due)."""
+    return max(0, _sntp_next_ns - time.monotonic_ns()) / 1e9
+
+def sntp_backing_off() -> bool:
+    """True during a kiss-o'-death backoff (no SNTP queries are sent)."""
+    return time.monotonic_ns() < _sntp_kod_until_ns
+
+async def _sntp_endpoint() -> _SntpProtocol:
+    """Return the shared SNTP endpoint, creating (and resolving) it on first use."""
+    global _sntp
+    if _sntp is None or _sntp.transport is None or _sntp.transport.is_closing():
+        loop = asyncio.get_running_loop()
+        _, _sntp = await loop.create_datagram_endpoint(
+            _SntpProtocol, remote_addr=(NTP_SERVER, NTP_PORT)
+        )
+    return _sntp
+
+def _sntp_reset() -> None:
+    """Drop the shared endpoint so the next call re-resolves the server."""
+    global _sntp
+    if _sntp is not None and _sntp.transport is not None:
+        _sntp.transport.close()
+    _sntp = None
+
+async def measure_skew_sntp() -> Optional[int]:
+    """
+    Query NTP_SERVER with a single SNTP packet and return the local clock
+    offset in nanoseconds: ((T2 - T1) + (T3 - T4)) / 2, i.e. server - local.
+    If the rate limit is still closed this waits for it (callers schedule
+    around sntp_wait_s()); None means a real failure: socket error, timeout,
+    malformed reply, or a kiss-o'-death (and its backoff window).
+    """
+    global _sntp_next_ns, _sntp_kod_until_ns
+    if sntp_backing_off():
+        return None
+    wait = sntp_wait_s()
+    if wait:
+        await asyncio.sleep(wait)
+    _sntp_next_ns = time.monotonic_ns() + SNTP_MIN_INTERVAL_NS
+    try:
+        proto = await _sntp_endpoint()
+        proto.waiter = asyncio.get_running_loop().create_future()
+        t1 = time.time_ns()
+        # Our transmit time doubles as a nonce: the server echoes it back
+        # as the reply's originate timestamp
+        origin = _ns_to_ntp(t1)
+        proto.transport.sendto(SNTP_REQUEST_HEAD + origin)
+        data, t4 = await asyncio.wait_for(proto.waiter, timeout=SNTP_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, ConnectionError) as e:
+        log(f"[WARN] SNTP query to {NTP_SERVER} failed: {e!r}")
+        _sntp_reset()
+        return None
+    finally:
+        if _sntp is not None:
+            _sntp.waiter = None
+    if len(data) < 48 or data[0] & 0x07 != 4:   # must be a server-mode reply
+        return None
+    if data[1] == 0:                            # stratum 0: kiss-o'-death
+        code = data[12:16].decode("ascii", "replace")
+        log(f"[WARN] SNTP kiss-o'-death from {NTP_SERVER}: {code}; backing off")
+        _sntp_kod_until_ns = time.monotonic_ns() + SNTP_KOD_BACKOFF_NS
+        return None
+    if data[24:32] != origin:                   # stale or spoofed reply
+        log(f"[WARN] SNTP reply from {NTP_SERVER} does not match our request")
+        return None
+    t2_s, t2_f, t3_s, t3_f = struct.unpack("!II II", data[32:48])
+    if not (t3_s or t3_f):                      # server never set its transmit time
+        return None
+    t2 = _ntp_to_ns(t2_s, t2_f)
+    t3 = _ntp_to_ns(t3_s, t3_f)
+    return ((t2 - t1) + (t3 - t4)) // 2
+
+# ---------------------------
+# Skew measurement functions (CLI fallbacks)
+# ---------------------------
+# Seconds value on a w32tm /query /status line, e.g. "Phase Offset: -0.0098767s"
+_OFFSET_RE = re.compile(r"([-+]?\d+\.\d+)\s*s")
+
 async def measure_skew_windows_stripchart() -> Optional[int]:
     """
     Use w32tm /stripchart to get a single sample in seconds and convert to ns.
     Returns nanoseconds (int) or None.
     """
     # Use time.windows.com as a stable reference. /dataonly gives lines like "15:10:00, -0.0090668s"
-    out = await run_cmd('w32tm /stripchart /computer:time.windows.com /dataonly /samples:1', timeout=10)
+    out = await run_cmd(["w32tm", "/stripchart", "/computer:time.windows.com", "/dataonly", "/samples:1"],
+                        timeout=10)
     if not out:
         return None
     # Find last comma line
@@ -166,14 +384,13 @@ async def measure_skew_windows_status() -> Optional[int]:
     Fallback parser that inspects 'w32tm /query /status' output for an 'Offset' line.
     Offset lines vary by locale; we attempt to find a numeric seconds value.
     """
-    out = await run_cmd("w32tm /query /status", timeout=6)
+    out = await run_cmd(["w32tm", "/query", "/status"], timeout=6)
     if not out:
         return None
     for line in out.splitlines():
         if "Offset" in line or "Local Clock" in line:
             # Find any float in the line
-            import re
-            m = re.search(r"([-+]?\d+\.\d+)\s*s", line)
+            m = _OFFSET_RE.search(line)
             if m:
                 try:
                     skew_s = float(m.group(1))
@@ -182,29 +399,33 @@ async def measure_skew_windows_status() -> Optional[int]:
                     continue
     return None
 
-async def measure_skew_windows() -> Optional[int]:
-    """Try stripchart first, fallback to status parsing."""
+async def measure_skew_windows() -> tuple[Optional[int], str]:
+    """Try SNTP first, then stripchart, then status parsing; returns (ns, source)."""
+    ns = await measure_skew_sntp()
+    if ns is not None:
+        return ns, "sntp"
     ns = await measure_skew_windows_stripchart()
     if ns is not None:
-        return ns
-    return await measure_skew_windows_status()
+        return ns, "stripchart"
+    return await measure_skew_windows_status(), "w32tm status"
 
 async def measure_skew_chrony() -> Optional[int]:
     """
-    Run 'chronyc tracking' and parse the 'Last offset' field.
-    Returns nanoseconds (int) or None.
-    Example line: 'Last offset     : 0.000056 seconds'
+    Run 'chronyc tracking' and parse the 'System time' field, the current
+    error of the system clock ('Last offset' is only chronyd's residual after
+    its last update).  Returns server - local in nanoseconds, like SNTP.
+    Example line: 'System time     : 0.000056 seconds slow of NTP time'
     """
-    out = await run_cmd("chronyc tracking", timeout=6)
+    out = await run_cmd(["chronyc", "tracking"], timeout=6)
     if not out:
         return None
     for line in out.splitlines():
-        if "Last offset" in line:
+        if line.startswith("System time"):
             try:
-                # Split at colon and take first numeric token
-                value = line.split(":", 1)[1].strip().split()[0]
-                skew_s = float(value)
-                return int(skew_s * 1e9)
+                value, _, direction = line.split(":", 1)[1].split()[:3]
+                skew_ns = int(float(value) * 1e9)
+                # "fast" = local clock ahead of NTP time = negative server - local
+                return -skew_ns if direction == "fast" else skew_ns
             except Exception:
                 return None
     return None
@@ -214,15 +435,15 @@ async def measure_skew_ntpd() -> Optional[int]:
     If ntpd/ntpsec tools are present but not chrony, we could use 'ntpq -c rv' or similar.
     This function tries 'ntpq -c rv' and looks for "offset=" key.
     """
-    out = await run_cmd("ntpq -c rv", timeout=6)
+    out = await run_cmd(["ntpq", "-c", "rv"], timeout=6)
     if not out:
         return None
-    # parse offset=VALUE
+    # parse offset=VALUE (milliseconds, server - local like SNTP)
     for token in out.replace(",", " ").split():
         if token.startswith("offset="):
             try:
-                skew_s = float(token.split("=", 1)[1])
-                return int(skew_s * 1e9)
+                skew_ms = float(token.split("=", 1)[1])
+                return int(skew_ms * 1e6)
             except Exception:
                 return None
     return None
@@ -230,25 +451,28 @@ async def measure_skew_ntpd() -> Optional[int]:
 # ---------------------------
 # Drift correction actions
 # ---------------------------
+# ntpd has no gentle slew command here; fall back to a one-shot ntpdate
+NTPDATE_CMD = ["sudo", "ntpdate", "-u", "pool.ntp.org"]
+
 async def apply_windows_small() -> None:
     """Apply small incremental adjustment on Windows."""
     # /nowait does not block; it asks service to adjust gradually
-    await run_cmd("w32tm /resync /nowait")
+    await run_cmd(["w32tm", "/resync", "/nowait"])
     log("[ACTION] w32tm /resync /nowait issued (small adjustment)")
 
 async def apply_windows_force() -> None:
     """Apply forced step on Windows."""
-    await run_cmd("w32tm /resync /force")
+    await run_cmd(["w32tm", "/resync", "/force"])
     log("[ACTION] w32tm /resync /force issued (forced step)")
 
 async def apply_chrony_small() -> None:
     """Apply a small precise chrony makestep (0.001 = 1 ms, but usable for smaller adjustments)."""
-    await run_cmd("chronyc makestep 0.001 3")
+    await run_cmd(["chronyc", "makestep", "0.001", "3"])
     log("[ACTION] chronyc makestep 0.001 3 issued (small adjustment)")
 
 async def apply_chrony_force() -> None:
     """Apply forced chrony makestep."""
-    await run_cmd("chronyc makestep")
+    await run_cmd(["chronyc", "makestep"])
     log("[ACTION] chronyc makestep issued (forced step)")
 
 # ---------------------------
@@ -259,17 +483,18 @@ async def drift_check_and_correct_windows() -> Optional[int]:
     Measure skew, decide action, memoize, and append to skew history.
     Returns skew_ns measured (or None).
     """
-    skew_ns = await measure_skew_windows()
+    global _last_skew_ns
+    skew_ns, source = await measure_skew_windows()
     if skew_ns is None:
         log("[WARN] Could not measure skew on Windows")
         return None
 
-    last = memo.get("last_skew_ns", 0)
-    memo["last_skew_ns"] = skew_ns
-    save_memo(memo := memo)  # persist
+    last = _last_skew_ns
+    _last_skew_ns = skew_ns
+    persist_memo(skew_ns)
 
     skew_history.append(skew_ns)
-    log(f"[MEASURE] Windows skew = {skew_ns} ns (previous {last} ns)")
+    log(f"[MEASURE] Windows skew ({source}) = {skew_ns} ns (previous {last} ns)")
 
     abs_skew = abs(skew_ns)
     # Small skew -> between configured precision threshold and 1 ms (1_000_000 ns)
@@ -284,49 +509,56 @@ async def drift_check_and_correct_windows() -> Optional[int]:
 
 async def drift_check_and_correct_unix() -> Optional[int]:
     """
-    Try chrony measurement first; if not present, try ntpq-style. Apply corrections similarly.
+    Measure via SNTP; if that fails fall back to chrony, then ntpq-style parsing.
+    Corrections use whichever local tool is installed.
     """
-    # prefer chrony
-    skew_ns = None
-    # check availability of commands
-    chrony_path = shutil.which("chronyc")
-    if chrony_path:
-        skew_ns = await measure_skew_chrony()
+    global _last_skew_ns
+    # prefer chrony, then ntpq (both looked up once at import); only the
+    # fallback parse and the corrective action need one
+    if _CHRONY:
         tool = "chrony"
+    elif _NTPQ:
+        tool = "ntpd"
     else:
-        # try ntpq
-        ntpq_path = shutil.which("ntpq")
-        if ntpq_path:
-            skew_ns = await measure_skew_ntpd()
-            tool = "ntpd"
-        else:
-            log("[WARN] No chronyc or ntpq available to measure skew")
-            return None
+        tool = None
+
+    skew_ns = await measure_skew_sntp()
+    source = "sntp"
+    if skew_ns is None and tool:
+        # SNTP actually failed (socket, timeout, kiss-o'-death): CLI fallback
+        skew_ns = await (measure_skew_chrony() if tool == "chrony" else measure_skew_ntpd())
+        source = tool
 
     if skew_ns is None:
-        log("[WARN] Could not parse skew from Unix tool output")
+        # A tool-less host has no sample during a kiss-o'-death backoff; the
+        # kiss itself was already logged
+        if tool or not sntp_backing_off():
+            log("[WARN] Could not measure skew (SNTP failed, no usable chronyc/ntpq output)")
         return None
 
-    last = memo.get("last_skew_ns", 0)
-    memo["last_skew_ns"] = skew_ns
-    save_memo(memo)
+    last = _last_skew_ns
+    _last_skew_ns = skew_ns
+    persist_memo(skew_ns)
 
     skew_history.append(skew_ns)
-    log(f"[MEASURE] {tool} skew = {skew_ns} ns (previous {last} ns)")
+    log(f"[MEASURE] {source} skew = {skew_ns} ns (previous {last} ns)")
 
     abs_skew = abs(skew_ns)
-    if PRECISION_THRESHOLD_NS < abs_skew < 1_000_000:
+    if tool is None:
+        if PRECISION_THRESHOLD_NS < abs_skew:
+            log("[DECISION] Skew out of tolerance but no chronyc/ntpq to correct it")
+    elif PRECISION_THRESHOLD_NS < abs_skew < 1_000_000:
         if tool == "chrony":
             await apply_chrony_small()
         else:
             # ntpd small change (ntpdate/ntpd method could be custom)
-            await run_cmd("sudo ntpdate -u pool.ntp.org || true")
+            await run_cmd(NTPDATE_CMD)
             log("[ACTION] ntpdate attempted for small skew")
     elif 100_000_000 < abs_skew < 1_000_000_000:
         if tool == "chrony":
             await apply_chrony_force()
         else:
-            await run_cmd("sudo ntpdate -u pool.ntp.org || true")
+            await run_cmd(NTPDATE_CMD)
             log("[ACTION] ntpdate attempted for large skew")
     else:
         log("[DECISION] No adjustment required for Unix (skew within negligible range)")
@@ -335,67 +567,154 @@ async def drift_check_and_correct_unix() -> Optional[int]:
 # ---------------------------
 # ASCII Graph rendering
 # ---------------------------
+# Cached terminal size: refreshed on SIGWINCH where available, otherwise
+# re-queried every TERM_REFRESH_FRAMES frames (Windows)
+TERM_REFRESH_FRAMES = 10
+_TERM_W, _TERM_H = shutil.get_terminal_size((120, 30))
+_term_frames = 0
+
+def _refresh_term_size() -> None:
+    global _TERM_W, _TERM_H
+    _TERM_W, _TERM_H = shutil.get_terminal_size((120, 30))
+
+def watch_term_size() -> None:
+    """Install the SIGWINCH handler that keeps the cached size current (POSIX only)."""
+    if hasattr(signal, "SIGWINCH"):
+        signal.signal(signal.SIGWINCH, lambda *_: _refresh_term_size())
+
+def _stdout_can_encode(text: str) -> bool:
+    """True if the console encoding can represent *text* (e.g. not plain ASCII)."""
+    try:
+        text.encode(sys.stdout.encoding or "ascii")
+        return True
+    except (UnicodeEncodeError, LookupError):
+        return False
+
+# Graph glyphs are single cp437 bytes (one byte per cell) and the frame is
+# decoded as cp437, giving ▄ ▀ │ — or plain ASCII if stdout cannot encode them
+_GRAPH_CODEC = "cp437"
+if _stdout_can_encode("▄▀│±"):
+    _POS_CH, _NEG_CH, _AXIS_CH = b"\xdc", b"\xdf", b"\xb3"
+    _PLUS_MINUS = "±"
+else:
+    _POS_CH, _NEG_CH, _AXIS_CH = b"#", b"-", b"|"
+    _PLUS_MINUS = "+/-"
+_POS_GLYPH, _NEG_GLYPH, _AXIS_GLYPH = (
+    ch.decode(_GRAPH_CODEC) for ch in (_POS_CH, _NEG_CH, _AXIS_CH)
+)
+# cp437 has no ellipsis, so this is checked on its own
+_WAITING = "[waiting for first sample" + ("…]" if _stdout_can_encode("…") else "...]")
+
+# Reusable frame buffer: MAX_GRAPH_LINES rows of plot_w cells plus "\n",
+# reset each frame from a blank template (spaces + axis + newlines)
+_frame_buf: bytearray | None = None
+_frame_blank = b""
+_frame_w = 0
+
+def _frame_for(plot_w: int) -> bytearray:
+    """Return the frame buffer for plot_w, reallocating only when the width changes."""
+    global _frame_buf, _frame_blank, _frame_w
+    if _frame_buf is None or _frame_w != plot_w:
+        center = plot_w // 2
+        row = b" " * center + _AXIS_CH + b" " * (plot_w - center - 1) + b"\n"
+        _frame_blank = row * MAX_GRAPH_LINES
+        _frame_buf = bytearray(_frame_blank)
+        _frame_w = plot_w
+    else:
+        _frame_buf[:] = _frame_blank
+    return _frame_buf
+
 def render_graph() -> str:
     """
     Render the skew history as a horizontal graph using block characters.
     Center column is zero; right = positive offset, left = negative.
     """
-    width = shutil.get_terminal_size((120, 30)).columns
+    width = _TERM_W
     # Reserve margin for labels; use only inner width for plotting
     plot_w = max(20, width - 20)
     center = plot_w // 2
 
+    samples = skew_history.samples()
+    if not samples:
+        return _WAITING
+
     # Determine scale: map max abs skew in history to half-plot width
-    max_abs = max((abs(x) for x in skew_history), default=1)
+    max_abs = max(max(samples), -min(samples))
     scale = max_abs / (center - 1) if max_abs > 0 else 1
 
-    lines = []
-    # Top header row with numeric scale (approx)
-    header = f"Scale: {int(max_abs)} ns (center=0)"
-    lines.append(header)
-    # For each sample produce a single-line bar
-    for val in list(skew_history):
-        # compute offset in columns
-        if scale <= 0:
-            offs = 0
-        else:
-            offs = int(round(val / scale))
-        # clamp
-        left = center + min(offs, 0)
-        right = center + max(offs, 0)
-
-        row = []
-        for c in range(plot_w):
-            if c == center:
-                # center axis
-                row.append("")
-            elif left <= c < center and offs < 0:
-                row.append("?")   # left block (negative)
-            elif center < c <= right and offs > 0:
-                row.append("")   # right block (positive)
-            else:
-                row.append(" ")
-        # Prepend timestamp or short index for readability
-        lines.append("".join(row))
-    # Keep only last ~20 lines to avoid too long output in small terminals
-    max_lines = min(40, len(lines))
-    return "\n".join(lines[-max_lines:])
+    # Top header row with numeric scale (approx); it scrolls off with the
+    # oldest samples once the history outgrows the screen
+    if len(samples) < MAX_GRAPH_LINES:
+        header = f"Scale: {_PLUS_MINUS}{int(max_abs)} ns (center=0)\n"
+    else:
+        header = ""
+        samples = samples[-MAX_GRAPH_LINES:]
+
+    # One contiguous bar per row, written with a single slice assignment
+    buf = _frame_for(plot_w)
+    stride = plot_w + 1
+    base = center
+    for val in samples:
+        # compute offset in columns, clamped to the plot
+        offs = int(round(val / scale))
+        offs = max(-center, min(plot_w - center - 1, offs))
+        if offs < 0:
+            buf[base + offs:base] = _NEG_CH * -offs         # left block (negative)
+        elif offs > 0:
+            buf[base + 1:base + offs + 1] = _POS_CH * offs  # right block (positive)
+        base += stride
+    return (header + buf[:len(samples) * stride].decode(_GRAPH_CODEC)).rstrip("\n")
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J"      # cursor home + erase display
+
+# Static TUI slabs, built once
+_HEADER = ("+" + "-" * 46 + "+\n"
+           f"{_AXIS_GLYPH}   Time Drift Monitor (Nanosecond TUI)       {_AXIS_GLYPH}\n"
+           "+" + "-" * 46 + "+\n\n")
+_LEGEND = (f"\nLegend: center{_AXIS_GLYPH}=0 ns, right=positive ({_POS_GLYPH}),"
+           f" left=negative ({_NEG_GLYPH})\n")
+_FOOTER = (f"Log: {STATUS_FILE} | Memo: {MEMO_FILE}\n"
+           "Press Ctrl-C to exit (if running interactively).\n")
+
+def enable_vt_mode() -> None:
+    """Enable ANSI escape processing on the Windows console (no-op elsewhere)."""
+    if not IS_WINDOWS:
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)             # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        pass
 
 def draw_tui() -> None:
     """Clear screen and draw TUI (header + graph + stats)."""
-    os.system("cls" if IS_WINDOWS else "clear")
-    # Header box
-    print("+" + "-" * 46 + "+")
-    print("   Time Drift Monitor (Nanosecond TUI)       ")
-    print("+" + "-" * 46 + "+\n")
-    # Graph
-    print(render_graph())
-    # Footer stats
     last = skew_history[-1] if skew_history else 0
-    print("\nLegend: center=0 ns, right=positive (), left=negative (?)")
-    print(f"Mode: {MODE} | Samples: {len(skew_history)} | Last skew: {last} ns")
-    print(f"Log: {STATUS_FILE} | Memo: {MEMO_FILE}")
-    print("Press Ctrl-C to exit (if running interactively).")
+    # Whole frame (clear + header + graph + footer stats) in one write/flush
+    sys.stdout.write(
+        CLEAR_SCREEN + _HEADER + render_graph() + "\n" + _LEGEND
+        + f"Mode: {MODE} | Samples: {len(skew_history)} | Last skew: {last} ns\n"
+        + _FOOTER
+    )
+    sys.stdout.flush()
+
+_last_frame_key: tuple | None = None
+
+def refresh_tui() -> None:
+    """Redraw the TUI only if the history or terminal size changed since the last frame."""
+    global _last_frame_key, _term_frames
+    if not hasattr(signal, "SIGWINCH"):
+        _term_frames += 1
+        if _term_frames % TERM_REFRESH_FRAMES == 0:
+            _refresh_term_size()
+    key = (skew_history.revision, _TERM_W, _TERM_H)
+    if key == _last_frame_key:
+        return
+    draw_tui()
+    _last_frame_key = key
 
 # ---------------------------
 # Main ultrafast loop
@@ -403,13 +722,42 @@ def draw_tui() -> None:
 async def ultrafast_loop() -> None:
     """Continuously measure, correct, and display TUI."""
     log("[ULTRAFAST] Entering continuous monitoring loop...")
+    enable_vt_mode()
+    watch_term_size()
+    last_flush_ns = time.monotonic_ns()
+    interval: float = CHECK_INTERVAL
+    stable_count = 0
     while True:
-        if IS_WINDOWS:
-            await drift_check_and_correct_windows()
+        # Start the measurement, let it get its request on the wire, then
+        # redraw (previous samples) while the reply is in flight
+        task = asyncio.create_task(
+            drift_check_and_correct_windows() if IS_WINDOWS else drift_check_and_correct_unix()
+        )
+        await asyncio.sleep(0)
+        refresh_tui()
+        skew_ns = await task
+        refresh_tui()                   # show the new sample now, not a whole interval later
+        now = time.monotonic_ns()
+        if now - last_flush_ns >= STATUS_FLUSH_INTERVAL_NS:
+            STATUS_FH.flush()
+            last_flush_ns = now
+
+        if skew_ns is None:
+            # No sample (already logged by the check); just re-probe soon
+            stable_count = 0
+            interval = CHECK_INTERVAL
+        elif abs(skew_ns) < PRECISION_THRESHOLD_NS:
+            stable_count += 1
+            interval = min(interval * BACKOFF_FACTOR, MAX_CHECK_INTERVAL)
         else:
-            await drift_check_and_correct_unix()
-        draw_tui()
-        await asyncio.sleep(CHECK_INTERVAL)
+            if stable_count:
+                log(f"[ULTRAFAST] Skew left tolerance after {stable_count} stable checks; "
+                    f"polling every {CHECK_INTERVAL}s again")
+            stable_count = 0
+            interval = CHECK_INTERVAL
+        # Never tick faster than SNTP may be queried, so every tick gets a
+        # fresh SNTP sample instead of falling back to the CLI tools
+        await asyncio.sleep(max(interval, sntp_wait_s()))
 
 # ---------------------------
 # One-shot runner (fast/lazy modes)
@@ -427,12 +775,8 @@ async def one_shot_run() -> None:
 # Entrypoint
 # ---------------------------
 async def main() -> None:
-    """Main dispatcher entry  chooses ultrafast loop or single run."""
+    """Main dispatcher entry — chooses ultrafast loop or single run."""
     log(f"Starting dispatchTUI on {platform.system()} | Mode={MODE}")
-    # Ensure history prepopulated (avoid empty graph)
-    if not skew_history:
-        for _ in range(4):
-            skew_history.append(0)
     if MODE == "ultrafast":
         await ultrafast_loop()
     else:
@@ -444,5 +788,3 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n[EXIT] Interrupted by user.")
         sys.exit(0)
-```
-
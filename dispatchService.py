@@ -12,16 +12,21 @@ Usage:
     python dispatchService.py --mode=ultrafast --pool=pool.chrony.eu
 """
 
-import runpy
 import sys
 import os
 
 # Resolve dispatcher.py relative to this file so it works regardless of cwd
 _here = os.path.dirname(os.path.abspath(__file__))
-_dispatcher = os.path.join(_here, "dispatcher.py")
+if _here not in sys.path:
+    sys.path.insert(0, _here)
 
-if not os.path.exists(_dispatcher):
-    print(f"[ERROR] dispatcher.py not found at {_dispatcher}", file=sys.stderr)
+# A regular import reuses dispatcher's cached bytecode; runpy.run_path()
+# recompiled the whole source on every scheduled invocation.
+try:
+    import dispatcher
+except ImportError as exc:
+    print(f"[ERROR] Cannot import dispatcher.py from {_here}: {exc}", file=sys.stderr)
     sys.exit(1)
 
-runpy.run_path(_dispatcher, run_name="__main__")
+if __name__ == "__main__":
+    dispatcher.run()
@@ -15,13 +15,28 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import atexit
 import json
 import os
 import platform
+import re
+import shutil
 import signal
+import struct
 import sys
-from datetime import datetime, timezone
-from typing import Optional
+import time
+from typing import Awaitable, Callable, Optional, TextIO
+
+try:
+    import winreg  # Windows only
+except ImportError:
+    winreg = None
+
+try:
+    import win32service  # pywin32, optional
+    import win32serviceutil
+except ImportError:
+    win32service = win32serviceutil = None
 
 # ---------------------------------------------------------------------------
 # CLI
@@ -51,10 +66,10 @@ def parse_args() -> argparse.Namespace:
 # Constants
 # ---------------------------------------------------------------------------
 
-IS_WINDOWS = platform.system() == "Windows"
+PLATFORM   = platform.system()
+IS_WINDOWS = PLATFORM == "Windows"
 
 LOG_DIR = r"C:\ProgramData\TimeSync" if IS_WINDOWS else "/var/log/time-sync"
-os.makedirs(LOG_DIR, exist_ok=True)
 
 LOG_FILE  = os.path.join(LOG_DIR, "status.log")
 MEMO_FILE = os.path.join(LOG_DIR, "memo.json")
@@ -71,6 +86,36 @@ DEFAULT_POOLS: list[str] = [
     "2.asia.pool.ntpsec.org",
 ]
 
+# pool.ntp.org-style zones only publish the 0.–3. sub-pools
+POOL_PREFIXES = (0, 1, 2, 3)
+
+
+def _is_pool_zone(pool: str) -> bool:
+    """True for an unnumbered pool zone (pool.ntp.org), not a host or a 0.-style sub-pool."""
+    labels = pool.split(".")
+    return "pool" in labels and not labels[0].isdigit()
+
+
+def _pool_hosts(pool: str) -> list[str]:
+    """The server names actually configured (and probed) for *pool*."""
+    if _is_pool_zone(pool):
+        return [f"{i}.{pool}" for i in POOL_PREFIXES]
+    return [pool]
+
+
+# w32tm /manualpeerlist values, built once per pool
+_POOL_PEERLISTS: dict[str, str] = {
+    pool: " ".join(f"{host},0x8" for host in _pool_hosts(pool)) for pool in DEFAULT_POOLS
+}
+
+
+def _peer_list(pool: str) -> str:
+    peers = _POOL_PEERLISTS.get(pool)
+    if peers is None:  # --pool override not in DEFAULT_POOLS
+        peers = _POOL_PEERLISTS[pool] = " ".join(f"{host},0x8" for host in _pool_hosts(pool))
+    return peers
+
+
 # Per-mode tuning
 MODE_CONFIG: dict[str, dict] = {
     "ultrafast": {"interval": 5,    "threshold_ns": 1_000},        # 1 µs
@@ -84,53 +129,219 @@ LARGE_SKEW_MIN_NS  = 100_000_000     # 100 ms — forced step
 LARGE_SKEW_MAX_NS  = 1_000_000_000   # 1 s   — cap (>1 s = probably clock jump, not drift)
 
 CMD_TIMEOUT = 15  # seconds before a subprocess is considered hung
+MEASURE_TIMEOUT = 3.0  # skew probes give up early; a missed sample is cheap
+
+
+def _max_procs() -> int:
+    try:
+        return max(1, int(os.environ["TIMESYNC_MAX_PROCS"]))
+    except (KeyError, ValueError):
+        return min(8, (os.cpu_count() or 1) * 2)
+
+
+# Upper bound on concurrently running child processes (override: TIMESYNC_MAX_PROCS).
+# Created inside the running loop: before Python 3.10 a Semaphore binds to
+# the loop current at construction, which is not the one asyncio.run() makes.
+_subproc_sem: asyncio.Semaphore | None = None
+_subproc_sem_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_subproc_sem() -> asyncio.Semaphore:
+    global _subproc_sem, _subproc_sem_loop
+    loop = asyncio.get_running_loop()
+    if _subproc_sem is None or _subproc_sem_loop is not loop:
+        _subproc_sem = asyncio.Semaphore(_max_procs())
+        _subproc_sem_loop = loop
+    return _subproc_sem
+
+
+# Circuit breaker: after this many consecutive failed measurements, skip
+# drift correction for the next MEASURE_BACKOFF_CYCLES calls.
+MEASURE_FAIL_LIMIT = 3
+MEASURE_BACKOFF_CYCLES = 6
+
+# Pool reachability probe (one SNTP request per pool, all pools in parallel)
+POOL_SCORE_ALPHA = 0.3  # EWMA weight of the newest probe result
+NTP_PORT = 123
+POOL_PROBE_TIMEOUT = 2.0  # seconds; unreachable pools are given up on quickly
+SNTP_REQUEST = struct.pack("!B B B b 11I", 0x1B, 0, 0, 0, *([0] * 11))  # v3 client
+
+# Offset parsers, compiled once
+_STATUS_OFFSET_RE = re.compile(r"^.*[Oo]ffset.*?([-+]?\d+\.\d+)\s*s", re.M)   # w32tm /query /status
+_TRACK_RE = re.compile(rb"^Last offset\s*:\s*([-+\d.eE]+)", re.M)            # chronyc tracking (raw bytes)
 
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
 
+# Timestamps have 1 s resolution, so format each second only once
+_ts_sec = -1
+_ts_str = ""
+
+
 def _utc_ts() -> str:
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    global _ts_sec, _ts_str
+    sec = int(time.time())
+    if sec != _ts_sec:
+        _ts_str = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(sec))
+        _ts_sec = sec
+    return _ts_str
+
+
+_log_fh: TextIO | None = None
+_log_dir_ready = False
+
+
+def _ensure_log_dir() -> None:
+    """Create LOG_DIR on first write rather than at import.  Raises OSError."""
+    global _log_dir_ready
+    if not _log_dir_ready:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _log_dir_ready = True
+
+
+def _log_handle() -> TextIO:
+    """
+    Return the single LOG_FILE handle kept open for the whole run (opened
+    on first use, closed at exit).  Raises OSError.
+    """
+    global _log_fh
+    if _log_fh is None:
+        _ensure_log_dir()
+        _log_fh = open(LOG_FILE, "a", encoding="utf-8", buffering=8192)
+        atexit.register(_log_fh.close)
+    return _log_fh
+
+
+def _append_log(text: str) -> None:
+    """Append *text* to LOG_FILE.  Raises OSError."""
+    fh = _log_handle()
+    fh.write(text)
+    fh.flush()
+
+
+def _append_log_bytes(*chunks: bytes) -> None:
+    """
+    Append pre-encoded *chunks* to LOG_FILE in one flush, bypassing the
+    text layer of the shared handle: no newline translation or re-encoding
+    happens, so chunks must already be UTF-8 with os.linesep line ends.
+    Raises OSError.
+    """
+    fh = _log_handle()
+    fh.flush()
+    raw = fh.buffer
+    raw.writelines(chunks)
+    raw.flush()
 
 
 def log(msg: str) -> None:
     line = f"[{_utc_ts()}] {msg}"
     print(line, flush=True)
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as fh:
-            fh.write(line + "\n")
+        _append_log(line + "\n")
     except OSError as exc:
         print(f"[LOG-ERR] Cannot write log: {exc}", file=sys.stderr)
 
 
+def enable_vt_mode() -> None:
+    """Enable ANSI escape processing on the Windows console (no-op elsewhere)."""
+    if not IS_WINDOWS:
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)             # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+    except (AttributeError, OSError):
+        pass
+
+
 # ---------------------------------------------------------------------------
-# Shell runner
+# Command runners
 # ---------------------------------------------------------------------------
 
-async def run_cmd(cmd: str) -> str:
+async def _collect(
+    spawn: Callable[[], Awaitable[asyncio.subprocess.Process]], cmd: str, timeout: float
+) -> tuple[int, bytes]:
     """
-    Run *cmd* in a shell, return stdout as str.
+    Call *spawn* once a process slot is free, collect the child's exit code
+    and raw stdout and apply the shared error policy.  The exit code is -1
+    when the child timed out or could not be started.
+    """
+    proc = None
+    async with _get_subproc_sem():
+        try:
+            proc = await spawn()
+            out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            stderr = err.decode(errors="ignore").strip()
+            if stderr:
+                log(f"[CMD-ERR] {cmd!r} => {stderr}")
+            return proc.returncode, out.strip() if out else b""
+        except asyncio.TimeoutError:
+            log(f"[CMD-ERR] Timeout ({timeout}s): {cmd!r}")
+            if proc is not None and proc.returncode is None:
+                try:
+                    proc.kill()
+                    await proc.wait()
+                except ProcessLookupError:
+                    pass
+            return -1, b""
+        except Exception as exc:
+            log(f"[CMD-ERR] Exception running {cmd!r}: {exc}")
+            return -1, b""
+
+
+async def run_cmd(cmd: str, timeout: float = CMD_TIMEOUT) -> tuple[int, str]:
+    """
+    Run *cmd* in a shell, return (returncode, stdout as str).
     Stderr is logged at [CMD-ERR] level.
-    Returns "" on timeout or error (never raises).
+    Returns (-1, "") on timeout or error (never raises); a hung child is killed.
+    Only needed for pipelines / `||` chains — prefer run_exec().
     """
-    try:
-        proc = await asyncio.create_subprocess_shell(
+    rc, out = await _collect(
+        lambda: asyncio.create_subprocess_shell(
             cmd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-        )
-        out, err = await asyncio.wait_for(proc.communicate(), timeout=CMD_TIMEOUT)
-        stdout = out.decode(errors="ignore").strip()
-        stderr = err.decode(errors="ignore").strip()
-        if stderr:
-            log(f"[CMD-ERR] {cmd!r} => {stderr}")
-        return stdout
-    except asyncio.TimeoutError:
-        log(f"[CMD-ERR] Timeout ({CMD_TIMEOUT}s): {cmd!r}")
-        return ""
-    except Exception as exc:
-        log(f"[CMD-ERR] Exception running {cmd!r}: {exc}")
-        return ""
+        ),
+        cmd,
+        timeout,
+    )
+    return rc, out.decode(errors="ignore")
+
+
+async def _exec(argv: tuple[str, ...], timeout: float, stdout: int = asyncio.subprocess.PIPE) -> tuple[int, bytes]:
+    return await _collect(
+        lambda: asyncio.create_subprocess_exec(*argv, stdout=stdout, stderr=asyncio.subprocess.PIPE),
+        " ".join(argv),
+        timeout,
+    )
+
+
+async def run_exec(*argv: str, timeout: float = CMD_TIMEOUT) -> tuple[int, str]:
+    """
+    Run *argv* directly (no intermediate shell), return (returncode, stdout
+    as str).  Same logging and never-raises contract as run_cmd().
+    """
+    rc, out = await _exec(argv, timeout)
+    return rc, out.decode(errors="ignore")
+
+
+async def run_exec_bytes(*argv: str, timeout: float = CMD_TIMEOUT) -> bytes:
+    """run_exec() stdout without the decode, for output that is only copied to a file."""
+    _, out = await _exec(argv, timeout)
+    return out
+
+
+async def run_fire(*argv: str, timeout: float = CMD_TIMEOUT) -> bool:
+    """
+    Run *argv* for its side effect only: stdout goes to DEVNULL, stderr is
+    logged as usual.  Returns True when the command exited 0.
+    """
+    rc, _ = await _exec(argv, timeout, asyncio.subprocess.DEVNULL)
+    return rc == 0
 
 
 # ---------------------------------------------------------------------------
@@ -151,6 +362,7 @@ def save_memo(data: dict) -> None:
     """Atomic write via temp-file rename to prevent corruption on crash."""
     tmp = MEMO_FILE + ".tmp"
     try:
+        _ensure_log_dir()
         with open(tmp, "w", encoding="utf-8") as fh:
             json.dump(data, fh)
         os.replace(tmp, MEMO_FILE)
@@ -158,69 +370,330 @@ def save_memo(data: dict) -> None:
         log(f"[WARN] Could not save memo: {exc}")
 
 
+# The memo is held in memory; memo.json is read once and the skew is only
+# rewritten when it has moved by more than the active threshold since the
+# last persisted value.
+_memo: dict = {}
+_memo_loaded = False
+_last_skew_ns = 0
+_persisted_skew_ns = 0
+
+
+def init_memo() -> None:
+    global _memo, _memo_loaded, _last_skew_ns, _persisted_skew_ns
+    if _memo_loaded:
+        return
+    _memo = load_memo()
+    _last_skew_ns = _persisted_skew_ns = int(_memo.get("last_skew_ns", 0))
+    _memo_loaded = True
+
+
+def _record_skew(skew_ns: int, threshold_ns: int) -> int:
+    """Store *skew_ns* as the latest sample and return the previous one."""
+    global _last_skew_ns, _persisted_skew_ns
+    init_memo()
+    last_ns, _last_skew_ns = _last_skew_ns, skew_ns
+    if abs(skew_ns - _persisted_skew_ns) > threshold_ns:
+        _memo["last_skew_ns"] = skew_ns
+        save_memo(_memo)
+        _persisted_skew_ns = skew_ns
+    return last_ns
+
+
+_measure_failures = 0
+_skip_cycles = 0
+
+
+def _breaker_open() -> bool:
+    """True while the measurement circuit breaker is skipping cycles."""
+    global _skip_cycles
+    if _skip_cycles:
+        _skip_cycles -= 1
+        log(f"[WARN] Skew probes failing — skipping drift correction ({_skip_cycles} cycles left)")
+        return True
+    return False
+
+
+def _note_measurement(ok: bool) -> None:
+    global _measure_failures, _skip_cycles
+    if ok:
+        _measure_failures = 0
+        return
+    _measure_failures += 1
+    if _measure_failures >= MEASURE_FAIL_LIMIT:
+        log(f"[WARN] {_measure_failures} consecutive skew probe failures — backing off "
+            f"for {MEASURE_BACKOFF_CYCLES} cycles")
+        _measure_failures = 0
+        _skip_cycles = MEASURE_BACKOFF_CYCLES
+
+
+def _decide_action(skew_ns: int, threshold_ns: int) -> str:
+    """Classify a skew sample as "none", "small", "large" or "ignore"."""
+    abs_ns = abs(skew_ns)
+    if abs_ns < threshold_ns:
+        return "none"
+    if abs_ns < SMALL_SKEW_MAX_NS:
+        return "small"
+    if LARGE_SKEW_MIN_NS < abs_ns < LARGE_SKEW_MAX_NS:
+        return "large"
+    return "ignore"
+
+
+async def _apply_action(actions: dict[str, tuple[tuple[str, ...], str]], action: str, skew_ns: int) -> None:
+    if action == "none":
+        log("[INFO] Skew within tolerance — no action")
+    elif action == "ignore":
+        log(f"[INFO] Skew {abs(skew_ns):,} ns outside actionable band — no action")
+    else:
+        argv, msg = actions[action]
+        await run_fire(*argv)
+        log(msg)
+
+
+# ---------------------------------------------------------------------------
+# Pool selection
+# ---------------------------------------------------------------------------
+
+class _SntpProbe(asyncio.DatagramProtocol):
+    """Resolves *done* with True on the first valid server-mode SNTP reply."""
+
+    def __init__(self, done: asyncio.Future) -> None:
+        self.done = done
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if not self.done.done():
+            self.done.set_result(len(data) >= 48 and data[0] & 0x07 == 4)
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.done.done():
+            self.done.set_result(False)
+
+
+async def _probe_host(host: str) -> bool:
+    """Return True if *host* answers one SNTP request within POOL_PROBE_TIMEOUT."""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    transport = None
+
+    async def _exchange() -> bool:
+        nonlocal transport
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _SntpProbe(done), remote_addr=(host, NTP_PORT)
+        )
+        transport.sendto(SNTP_REQUEST)
+        return await done
+
+    try:
+        return await asyncio.wait_for(_exchange(), timeout=POOL_PROBE_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        if transport is not None:
+            transport.close()
+
+
+async def _probe_pool(pool: str) -> bool:
+    """Return True as soon as any host configured for *pool* answers a probe."""
+    tasks = [asyncio.create_task(_probe_host(host)) for host in _pool_hosts(pool)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            if await fut:
+                return True
+        return False
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def select_pool(pools: list[str]) -> Optional[str]:
+    """
+    Probe all *pools* concurrently and return the first reachable one in
+    priority order, or None.  Total wait is bounded by the slowest probe
+    ahead of the winner instead of the sum of every timeout; probes still
+    running once a winner is known are cancelled.  Every probe that has
+    finished by then is scored, including ones ranked below the winner, so
+    a demoted pool can earn its place back.
+    """
+    init_memo()
+    tasks = [asyncio.create_task(_probe_pool(pool)) for pool in pools]
+    scored: set[str] = set()
+    changed = False
+    try:
+        for pool, task in zip(pools, tasks):
+            ok = await task
+            changed |= _score_pool(pool, ok)
+            scored.add(pool)
+            if ok:
+                return pool
+            log(f"[FAIL] Pool unreachable: {pool}")
+        return None
+    finally:
+        for pool, task in zip(pools, tasks):
+            if pool in scored:
+                continue
+            if task.done() and not task.cancelled() and task.exception() is None:
+                changed |= _score_pool(pool, task.result())
+            else:
+                task.cancel()
+        if changed:
+            save_memo(_memo)
+
+
+def _score_pool(pool: str, ok: bool) -> bool:
+    """
+    Fold one probe result into the pool's success EWMA (kept in the memo).
+    Returns True if the stored score changed.
+    """
+    scores = _memo.setdefault("pool_scores", {})
+    prev = scores.get(pool, 1.0)
+    score = round((1 - POOL_SCORE_ALPHA) * prev + POOL_SCORE_ALPHA * ok, 4)
+    if pool in scores and score == prev:
+        return False
+    scores[pool] = score
+    return True
+
+
+def rank_pools(pools: list[str]) -> list[str]:
+    """
+    Order *pools* by recent probe success, best first.  Unseen pools score
+    1.0 and ties keep the configured priority, so a fresh install probes
+    DEFAULT_POOLS in their listed order.
+    """
+    init_memo()
+    scores = _memo.get("pool_scores", {})
+    return sorted(pools, key=lambda pool: -scores.get(pool, 1.0))
+
+
 # ---------------------------------------------------------------------------
 # Windows
 # ---------------------------------------------------------------------------
 
+# Registry: poll intervals + client type, as (name, type, value) per subkey
+# of HKLM\SYSTEM\CurrentControlSet\Services\W32Time.
+_W32TIME_KEY = r"SYSTEM\CurrentControlSet\Services\W32Time"
+_W32TIME_REG_VALUES: dict[str, tuple[tuple[str, str, object], ...]] = {
+    "Config": (
+        ("MinPollInterval", "REG_DWORD", 0x6),
+        ("MaxPollInterval", "REG_DWORD", 0xA),
+    ),
+    "Parameters": (
+        ("Type", "REG_SZ", "NTP"),
+    ),
+    r"TimeProviders\NtpClient": (
+        ("Enabled", "REG_DWORD", 0x1),
+    ),
+}
+
+
+def _write_w32time_registry() -> None:
+    """Set the W32Time values in-process via winreg.  Raises OSError."""
+    for subkey, values in _W32TIME_REG_VALUES.items():
+        with winreg.CreateKeyEx(
+            winreg.HKEY_LOCAL_MACHINE, rf"{_W32TIME_KEY}\{subkey}", 0, winreg.KEY_SET_VALUE
+        ) as key:
+            for name, kind, value in values:
+                winreg.SetValueEx(key, name, 0, getattr(winreg, kind), value)
+
+
+def _scm_restart_w32time() -> bool:
+    """
+    Re-enable W32Time if it is stopped or disabled, then restart it, through
+    the Service Control Manager (pywin32).  Returns True if the service had
+    to be re-enabled.  Raises win32service.error.
+    """
+    scm = win32service.OpenSCManager(None, None, win32service.SC_MANAGER_CONNECT)
+    try:
+        access = (
+            win32service.SERVICE_QUERY_CONFIG
+            | win32service.SERVICE_CHANGE_CONFIG
+            | win32service.SERVICE_QUERY_STATUS
+        )
+        svc = win32service.OpenService(scm, "w32time", access)
+        try:
+            state = win32service.QueryServiceStatus(svc)[1]
+            start_type = win32service.QueryServiceConfig(svc)[1]
+            healed = state == win32service.SERVICE_STOPPED or start_type == win32service.SERVICE_DISABLED
+            if healed:
+                win32service.ChangeServiceConfig(
+                    svc, win32service.SERVICE_NO_CHANGE, win32service.SERVICE_AUTO_START,
+                    win32service.SERVICE_NO_CHANGE, None, None, 0, None, None, None, None,
+                )
+        finally:
+            win32service.CloseServiceHandle(svc)
+    finally:
+        win32service.CloseServiceHandle(scm)
+    win32serviceutil.RestartService("w32time")
+    return healed
+
+
+async def _sc_restart_w32time() -> None:
+    """Same as _scm_restart_w32time() via sc.exe / net.exe (no pywin32)."""
+    _, status = await run_exec("sc", "query", "w32time")
+    if "STOPPED" in status or "DISABLED" in status.upper():
+        log("[WARN] W32Time not running — enabling...")
+        await run_fire("sc", "config", "w32time", "start=", "auto")
+        await run_fire("sc", "start", "w32time")
+
+    await run_fire("net", "stop", "w32time")
+    await run_fire("net", "start", "w32time")
+
+
 async def windows_configure(pools: list[str]) -> None:
     """Apply registry tuning, ensure W32Time is running, configure peers."""
     log("Configuring Windows Time Service...")
 
-    # Registry: poll intervals + client type (no PowerShell dependency)
-    for cmd in (
-        r'reg add "HKLM\SYSTEM\CurrentControlSet\Services\W32Time\Config"'
-        r' /v MinPollInterval /t REG_DWORD /d 0x6 /f',
-
-        r'reg add "HKLM\SYSTEM\CurrentControlSet\Services\W32Time\Config"'
-        r' /v MaxPollInterval /t REG_DWORD /d 0xa /f',
+    # Native registry calls instead of one reg.exe per value; off the loop
+    # thread so the async contract holds.
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write_w32time_registry)
+    except OSError as exc:
+        log(f"[WARN] W32Time registry update failed: {exc}")
 
-        r'reg add "HKLM\SYSTEM\CurrentControlSet\Services\W32Time\Parameters"'
-        r' /v Type /t REG_SZ /d NTP /f',
+    # Enable NtpClient provider if disabled
+    await run_fire("w32tm", "/register")
 
-        r'reg add "HKLM\SYSTEM\CurrentControlSet\Services\W32Time\TimeProviders\NtpClient"'
-        r' /v Enabled /t REG_DWORD /d 0x1 /f',
-    ):
-        await run_cmd(cmd)
+    # Heal service if not running, then restart to pick up registry changes
+    if win32serviceutil is not None:
+        try:
+            if await asyncio.get_running_loop().run_in_executor(None, _scm_restart_w32time):
+                log("[WARN] W32Time was stopped/disabled — set to auto start")
+        except win32service.error as exc:
+            log(f"[WARN] SCM control of W32Time failed ({exc}) — falling back to sc/net")
+            await _sc_restart_w32time()
+    else:
+        await _sc_restart_w32time()
 
-    # Enable NtpClient provider if disabled
-    await run_cmd("w32tm /register")
+    # Highest-priority pool that is actually reachable
+    pool = await select_pool(pools)
+    if pool is None:
+        pool = pools[0]
+        log(f"[WARN] No pool answered the probe — configuring {pool} anyway")
 
-    # Heal service if not running
-    status = await run_cmd("sc query w32time")
-    if "STOPPED" in status or "DISABLED" in status.upper():
-        log("[WARN] W32Time not running — enabling...")
-        await run_cmd("sc config w32time start= auto")
-        await run_cmd("sc start w32time")
-
-    # Restart to pick up registry changes
-    await run_cmd("net stop w32time")
-    await run_cmd("net start w32time")
-
-    # Try pools in priority order
-    for pool in pools:
-        peer_list = " ".join(f"{i}.{pool},0x8" for i in range(1, 5))
-        result = await run_cmd(
-            f'w32tm /config /manualpeerlist:"{peer_list}" /syncfromflags:manual /update'
-        )
-        if result:
-            log(f"[OK] Peers configured: {pool}")
-            await run_cmd("w32tm /resync /nowait")
-            break
-        log(f"[FAIL] Could not configure pool: {pool}")
+    rc, out = await run_exec(
+        "w32tm", "/config", f"/manualpeerlist:{_peer_list(pool)}", "/syncfromflags:manual", "/update"
+    )
+    if rc == 0:
+        log(f"[OK] Peers configured: {pool}")
+        await run_fire("w32tm", "/resync", "/nowait")
     else:
-        log("[FAIL] All pools exhausted — W32Time left with prior config")
+        log(f"[FAIL] Could not configure pool: {pool} (exit {rc}) — W32Time left with prior config")
+        if out:
+            log(f"[FAIL] w32tm: {out}")
 
     await _windows_telemetry()
 
 
 async def _windows_telemetry() -> None:
-    status  = await run_cmd("w32tm /query /status")
-    peers   = await run_cmd("w32tm /query /peers")
+    # w32tm prints in the OEM code page with \r\n line ends, so it goes
+    # through the text layer (decoded, newlines translated) rather than
+    # the raw-bytes path
+    (_, status), (_, peers) = await asyncio.gather(
+        run_exec("w32tm", "/query", "/status"),
+        run_exec("w32tm", "/query", "/peers"),
+    )
+    report = f"{status}\n{peers}".replace("\r\n", "\n")
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as fh:
-            fh.write(f"\n===== Sync Report {_utc_ts()} =====\n")
-            fh.write(status + "\n")
-            fh.write(peers  + "\n")
+        _append_log(f"\n===== Sync Report {_utc_ts()} =====\n{report}\n")
     except OSError as exc:
         log(f"[WARN] Telemetry write failed: {exc}")
     log(f"[INFO] Telemetry written → {LOG_FILE}")
@@ -233,55 +706,47 @@ async def windows_measure_skew() -> Optional[int]:
     Fallback: parse 'w32tm /query /status' offset line.
     """
     # Primary: stripchart gives a clean "HH:MM:SS, -0.0090668s" line
-    out = await run_cmd(
-        "w32tm /stripchart /computer:time.windows.com /dataonly /samples:1"
+    _, out = await run_exec(
+        "w32tm", "/stripchart", "/computer:time.windows.com", "/dataonly", "/samples:1",
+        timeout=MEASURE_TIMEOUT,
     )
-    comma_lines = [l.strip() for l in out.splitlines() if "," in l]
-    if comma_lines:
-        try:
-            raw = comma_lines[-1].split(",", 1)[1].strip().rstrip("s")
-            return int(float(raw) * 1e9)
-        except (ValueError, IndexError):
-            pass
-
-    # Fallback: /query /status offset line
-    import re
-    out2 = await run_cmd("w32tm /query /status")
-    for line in out2.splitlines():
-        m = re.search(r"([-+]?\d+\.\d+)\s*s", line)
-        if m and ("Offset" in line or "offset" in line):
+    for line in reversed(out.splitlines()):
+        if "," in line:
             try:
-                return int(float(m.group(1)) * 1e9)
+                return int(float(line.split(",", 1)[1].strip().rstrip("s")) * 1e9)
             except ValueError:
-                continue
+                pass
+            break
+
+    # Fallback: /query /status offset line
+    _, out2 = await run_exec("w32tm", "/query", "/status", timeout=MEASURE_TIMEOUT)
+    m = _STATUS_OFFSET_RE.search(out2)
+    if m:
+        return int(float(m.group(1)) * 1e9)
     return None
 
 
-async def windows_drift_correct(threshold_ns: int) -> None:
-    memo = load_memo()
-    last_ns = memo.get("last_skew_ns", 0)
+# Corrective command and log line per decision band
+_WINDOWS_ACTIONS: dict[str, tuple[tuple[str, ...], str]] = {
+    "small": (("w32tm", "/resync", "/nowait"), "[ACTION] Incremental resync (small skew)"),
+    "large": (("w32tm", "/resync", "/force"),  "[ACTION] Forced step (large skew)"),
+}
 
+
+async def windows_drift_correct(threshold_ns: int) -> None:
+    if _breaker_open():
+        return
     skew_ns = await windows_measure_skew()
+    _note_measurement(skew_ns is not None)
     if skew_ns is None:
         log("[WARN] Skew measurement failed — issuing precautionary resync")
-        await run_cmd("w32tm /resync /force")
+        await run_fire("w32tm", "/resync", "/force")
         return
 
+    last_ns = _record_skew(skew_ns, threshold_ns)
     log(f"[INFO] Skew: {skew_ns:+,} ns (prev: {last_ns:+,} ns)")
-    memo["last_skew_ns"] = skew_ns
-    save_memo(memo)
 
-    abs_skew = abs(skew_ns)
-    if abs_skew < threshold_ns:
-        log("[INFO] Skew within tolerance — no action")
-    elif abs_skew < SMALL_SKEW_MAX_NS:
-        await run_cmd("w32tm /resync /nowait")
-        log("[ACTION] Incremental resync (small skew)")
-    elif LARGE_SKEW_MIN_NS < abs_skew < LARGE_SKEW_MAX_NS:
-        await run_cmd("w32tm /resync /force")
-        log("[ACTION] Forced step (large skew)")
-    else:
-        log(f"[INFO] Skew {abs_skew:,} ns outside actionable band — no action")
+    await _apply_action(_WINDOWS_ACTIONS, _decide_action(skew_ns, threshold_ns), skew_ns)
 
 
 async def windows_install_service(mode: str) -> None:
@@ -290,18 +755,18 @@ async def windows_install_service(mode: str) -> None:
     if not os.path.exists(nssm):
         log("[WARN] NSSM not found — skipping service install (manual or schtasks fallback)")
         # Fallback: scheduled task every 15 min
-        task_cmd = (
-            f'schtasks /Create /F /SC MINUTE /MO 15 /TN TimeSyncAgent /RU SYSTEM /RL HIGHEST'
-            f' /TR "\\"{sys.executable}\\" \\"{os.path.abspath(__file__)}\\" --mode={mode}"'
+        await run_fire(
+            "schtasks", "/Create", "/F", "/SC", "MINUTE", "/MO", "15", "/TN", "TimeSyncAgent",
+            "/RU", "SYSTEM", "/RL", "HIGHEST",
+            "/TR", f'"{sys.executable}" "{os.path.abspath(__file__)}" --mode={mode}',
         )
-        await run_cmd(task_cmd)
         log("[TASK] Scheduled task 'TimeSyncAgent' created (15-min interval)")
         return
 
     script = os.path.abspath(__file__)
-    await run_cmd(f'"{nssm}" install TimeSyncAgent "{sys.executable}" "{script} --mode={mode}"')
-    await run_cmd(f'"{nssm}" set TimeSyncAgent Start SERVICE_AUTO_START')
-    await run_cmd(f'"{nssm}" start TimeSyncAgent')
+    await run_fire(nssm, "install", "TimeSyncAgent", sys.executable, f"{script} --mode={mode}")
+    await run_fire(nssm, "set", "TimeSyncAgent", "Start", "SERVICE_AUTO_START")
+    await run_fire(nssm, "start", "TimeSyncAgent")
     log("[SERVICE] Installed as SYSTEM service via NSSM")
 
 
@@ -309,12 +774,19 @@ async def windows_install_service(mode: str) -> None:
 # Unix / macOS
 # ---------------------------------------------------------------------------
 
-async def _detect_unix_tool() -> Optional[str]:
-    """Return first available time sync tool, or None."""
-    for candidate in ("chronyc", "ntpq", "timedatectl"):
-        if await run_cmd(f"command -v {candidate}"):
-            return candidate
-    return None
+_TOOL_CACHE: Optional[str] = None
+_TOOL_CACHED = False
+
+
+def _detect_unix_tool() -> Optional[str]:
+    """Return first available time sync tool, or None (looked up once per run)."""
+    global _TOOL_CACHE, _TOOL_CACHED
+    if not _TOOL_CACHED:
+        _TOOL_CACHE = next(
+            (c for c in ("chronyc", "ntpq", "timedatectl") if shutil.which(c)), None
+        )
+        _TOOL_CACHED = True
+    return _TOOL_CACHE
 
 
 async def unix_configure(pools: list[str], mode: str) -> None:
@@ -325,15 +797,19 @@ async def unix_configure(pools: list[str], mode: str) -> None:
     log("Configuring Unix NTP client...")
 
     minpoll, maxpoll, makestep = (4, 8, "0.1 10") if mode == "fast" else (6, 10, "1.0 3")
-    primary = pools[0]
+    primary = await select_pool(pools)
+    if primary is None:
+        primary = pools[0]
+        log(f"[WARN] No pool answered the probe — configuring {primary} anyway")
 
     # --- chrony (preferred) ---
-    if await run_cmd("command -v chronyd"):
+    if shutil.which("chronyd"):
         conf_candidates = ("/etc/chrony/chrony.conf", "/etc/chrony.conf")
         conf = next((p for p in conf_candidates if os.path.exists(p)), conf_candidates[0])
         _backup(conf)
 
-        nts_supported = bool(await run_cmd("chronyc --help 2>&1 | grep -i nts"))
+        rc, _ = await run_cmd("chronyc --help 2>&1 | grep -qi nts")
+        nts_supported = rc == 0
         nts_line = " nts" if nts_supported else ""
 
         lines = [
@@ -344,8 +820,8 @@ async def unix_configure(pools: list[str], mode: str) -> None:
             "leapsectz right/UTC",
             "logdir /var/log/chrony",
         ]
-        for i in range(1, 5):
-            lines.append(f"pool {i}.{primary} iburst minpoll {minpoll} maxpoll {maxpoll}")
+        for host in _pool_hosts(primary):
+            lines.append(f"pool {host} iburst minpoll {minpoll} maxpoll {maxpoll}")
         # NTS-capable fallback servers (if chrony supports it)
         lines.append(
             f"server time.cloudflare.com iburst{nts_line} minpoll {minpoll} maxpoll {maxpoll}"
@@ -358,13 +834,13 @@ async def unix_configure(pools: list[str], mode: str) -> None:
         await run_cmd("systemctl restart chronyd 2>/dev/null || service chrony restart 2>/dev/null || true")
         await _chrony_telemetry()
         await _install_systemd_timer(
-            "chronyc tracking; chronyc sources -v", LOG_FILE
+            'chronyc -m tracking "sources -v"', LOG_FILE
         )
         log(f"[OK] chrony configured — pool={primary} mode={mode}")
         return
 
     # --- ntpsec / ntpd ---
-    if await run_cmd("command -v ntpd"):
+    if shutil.which("ntpd"):
         conf_candidates = ("/etc/ntpsec/ntp.conf", "/etc/ntp.conf")
         conf = next((p for p in conf_candidates if os.path.exists(p)), conf_candidates[1])
         _backup(conf)
@@ -374,8 +850,8 @@ async def unix_configure(pools: list[str], mode: str) -> None:
             "driftfile /var/lib/ntp/drift",
             "tinker panic 0",
         ]
-        for i in range(1, 5):
-            lines.append(f"pool {i}.{primary} iburst minpoll {minpoll} maxpoll {maxpoll}")
+        for host in _pool_hosts(primary):
+            lines.append(f"pool {host} iburst minpoll {minpoll} maxpoll {maxpoll}")
 
         _write_config(conf, "\n".join(lines))
         await run_cmd(
@@ -387,14 +863,13 @@ async def unix_configure(pools: list[str], mode: str) -> None:
         return
 
     # --- systemd-timesyncd (last resort) ---
-    if await run_cmd("systemctl list-unit-files 2>/dev/null | grep -q systemd-timesyncd && echo yes"):
+    rc, _ = await run_cmd("systemctl list-unit-files 2>/dev/null | grep -q systemd-timesyncd")
+    if rc == 0:
         conf = "/etc/systemd/timesyncd.conf"
         _backup(conf)
-        ntp_list = " ".join(
-            f"{i}.{primary}" for i in range(1, 5)
-        ) + " time.cloudflare.com time.google.com"
+        ntp_list = " ".join(_pool_hosts(primary)) + " time.cloudflare.com time.google.com"
         _write_config(conf, f"# Managed by NTPsecDispatcher\n[Time]\nNTP={ntp_list}\n")
-        await run_cmd("systemctl restart systemd-timesyncd || true")
+        await run_fire("systemctl", "restart", "systemd-timesyncd")
         log(f"[OK] systemd-timesyncd configured — pool={primary}")
         return
 
@@ -403,8 +878,7 @@ async def unix_configure(pools: list[str], mode: str) -> None:
 
 def _backup(path: str) -> None:
     if os.path.exists(path):
-        import shutil
-        dst = f"{path}.bak.{int(datetime.now(timezone.utc).timestamp())}"
+        dst = f"{path}.bak.{int(time.time())}"
         try:
             shutil.copy2(path, dst)
         except OSError:
@@ -420,19 +894,19 @@ def _write_config(path: str, content: str) -> None:
 
 
 async def _chrony_telemetry() -> None:
-    tracking = await run_cmd("chronyc tracking")
-    sources  = await run_cmd("chronyc sources -v")
+    # -m: both commands in one chronyc process / one chronyd round trip.
+    # chronyc (Unix only) prints UTF-8 with \n line ends, so its output is
+    # copied raw; the separators use the platform line end to match.
+    report = await run_exec_bytes("chronyc", "-m", "tracking", "sources -v")
+    nl = os.linesep.encode()
     try:
-        with open(LOG_FILE, "a") as fh:
-            fh.write(f"\n===== Sync Report {_utc_ts()} =====\n")
-            fh.write(tracking + "\n")
-            fh.write(sources  + "\n")
+        _append_log_bytes(nl, f"===== Sync Report {_utc_ts()} =====".encode(), nl, report, nl)
     except OSError:
         pass
 
 
 async def _install_systemd_timer(exec_cmd: str, log_path: str) -> None:
-    if not await run_cmd("command -v systemctl"):
+    if not shutil.which("systemctl"):
         return
     svc = "/etc/systemd/system/time-sync-telemetry.service"
     tmr = "/etc/systemd/system/time-sync-telemetry.timer"
@@ -457,24 +931,28 @@ Unit=time-sync-telemetry.service
 [Install]
 WantedBy=timers.target
 """)
-    await run_cmd("systemctl daemon-reload || true")
-    await run_cmd("systemctl enable --now time-sync-telemetry.timer || true")
+    await run_fire("systemctl", "daemon-reload")
+    await run_fire("systemctl", "enable", "--now", "time-sync-telemetry.timer")
 
 
 async def unix_measure_skew() -> Optional[int]:
     """Try chronyc tracking, then ntpq -c rv. Returns nanoseconds or None."""
+    tool = _detect_unix_tool()
+    if tool not in ("chronyc", "ntpq"):
+        return None  # nothing that reports an offset; don't spawn doomed probes
+
     # chrony
-    out = await run_cmd("chronyc tracking")
-    for line in out.splitlines():
-        if "Last offset" in line:
+    if tool == "chronyc":
+        out = await run_exec_bytes("chronyc", "tracking", timeout=MEASURE_TIMEOUT)
+        m = _TRACK_RE.search(out)
+        if m:
             try:
-                val = line.split(":", 1)[1].strip().split()[0]
-                return int(float(val) * 1e9)
-            except (ValueError, IndexError):
-                break
+                return int(float(m.group(1)) * 1e9)
+            except ValueError:
+                pass
 
     # ntpq fallback
-    out2 = await run_cmd("ntpq -c rv")
+    _, out2 = await run_exec("ntpq", "-c", "rv", timeout=MEASURE_TIMEOUT)
     for token in out2.replace(",", " ").split():
         if token.startswith("offset="):
             try:
@@ -484,30 +962,25 @@ async def unix_measure_skew() -> Optional[int]:
     return None
 
 
-async def unix_drift_correct(threshold_ns: int) -> None:
-    memo = load_memo()
-    last_ns = memo.get("last_skew_ns", 0)
+_UNIX_ACTIONS: dict[str, tuple[tuple[str, ...], str]] = {
+    "small": (("chronyc", "makestep", "0.001", "3"), "[ACTION] Incremental chrony step (small skew)"),
+    "large": (("chronyc", "makestep"),               "[ACTION] Forced chrony step (large skew)"),
+}
+
 
+async def unix_drift_correct(threshold_ns: int) -> None:
+    if _breaker_open():
+        return
     skew_ns = await unix_measure_skew()
+    _note_measurement(skew_ns is not None)
     if skew_ns is None:
         log("[WARN] Could not measure skew on Unix")
         return
 
+    last_ns = _record_skew(skew_ns, threshold_ns)
     log(f"[INFO] Skew: {skew_ns:+,} ns (prev: {last_ns:+,} ns)")
-    memo["last_skew_ns"] = skew_ns
-    save_memo(memo)
 
-    abs_skew = abs(skew_ns)
-    if abs_skew < threshold_ns:
-        log("[INFO] Skew within tolerance — no action")
-    elif abs_skew < SMALL_SKEW_MAX_NS:
-        await run_cmd("chronyc makestep 0.001 3 2>/dev/null || true")
-        log("[ACTION] Incremental chrony step (small skew)")
-    elif LARGE_SKEW_MIN_NS < abs_skew < LARGE_SKEW_MAX_NS:
-        await run_cmd("chronyc makestep 2>/dev/null || true")
-        log("[ACTION] Forced chrony step (large skew)")
-    else:
-        log(f"[INFO] Skew {abs_skew:,} ns outside actionable band")
+    await _apply_action(_UNIX_ACTIONS, _decide_action(skew_ns, threshold_ns), skew_ns)
 
 
 # ---------------------------------------------------------------------------
@@ -556,9 +1029,13 @@ async def main() -> None:
     mode = args.mode
     cfg  = MODE_CONFIG[mode]
 
-    pools = ([args.pool] + DEFAULT_POOLS) if args.pool else DEFAULT_POOLS
+    log(f"NTPsecDispatcher starting | platform={PLATFORM} mode={mode}")
+    init_memo()
 
-    log(f"NTPsecDispatcher starting | platform={platform.system()} mode={mode}")
+    # A forced pool always stays first; the defaults follow by track record
+    pools = rank_pools(DEFAULT_POOLS)
+    if args.pool:
+        pools = [args.pool] + pools
 
     if IS_WINDOWS:
         await windows_configure(pools)
@@ -574,9 +1051,14 @@ async def main() -> None:
         log(f"Dispatcher complete. Next run in {cfg['interval']}s (if scheduled).")
 
 
-if __name__ == "__main__":
+def run() -> None:
+    """Console entry point shared by dispatcher.py and dispatchService.py."""
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\n[EXIT] Interrupted.")
         sys.exit(0)
+
+
+if __name__ == "__main__":
+    run()
@@ -35,6 +35,7 @@ try:
     from dispatcher import (
         run_cmd,
         log,
+        enable_vt_mode,
         load_memo,
         save_memo,
         windows_measure_skew,
@@ -121,9 +122,13 @@ def render_graph(width: int) -> list[str]:
     return lines
 
 
+CLEAR_SCREEN = "\x1b[H\x1b[2J"   # cursor home + erase display
+
+
 def draw_tui(mode: str, interval: int) -> None:
     width = _term_width()
-    os.system("cls" if IS_WINDOWS else "clear")
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
 
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
     title = f"NTPsecDispatcher — Drift Monitor  [{mode.upper()} | {interval}s interval | {ts}]"
@@ -173,6 +178,8 @@ async def monitor_loop(mode: str) -> None:
         except (OSError, ValueError):
             pass
 
+    enable_vt_mode()
+
     # Pre-fill with zeros so graph renders immediately
     skew_history.extend([0] * min(4, HISTORY_LEN))
 